@@ -5,7 +5,17 @@ import re
 import zipfile
 import gzip
 import io
-from typing import Optional, List, Dict
+import os
+import sys
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Optional, List, Dict, Tuple
+
+# Logs [DEBUG] por vuelo solo si PARSE_DEBUG está definido (muy ruidosos en producción)
+DEBUG = bool(os.environ.get('PARSE_DEBUG'))
 
 # PDF extraction - try multiple libraries
 try:
@@ -20,6 +30,66 @@ try:
 except ImportError:
     HAS_PDFPLUMBER = False
 
+# JSON serialization - orjson is much faster for large flight lists
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Patrones precompilados (se usan por cada token/línea del documento)
+_RE_SPACED_DIGITS = re.compile(r'(\d)\s+(\d)')
+_RE_FOOTER = re.compile(
+    r'Emisi[oó]n\s+(\d{2}/\d{2})\s+Del\s+(\d{1,2})\s+de\s+([a-zA-Z]+)\s+(\d{4})\s+al\s+(\d{1,2})\s+de\s+([a-zA-Z]+)\s+(\d{4})',
+    re.IGNORECASE
+)
+_RE_FOOTER_START = re.compile(r'Emisi[oó]n', re.IGNORECASE)
+_RE_VUELO_CELL = re.compile(r'^(\d+)([A-Z]{3})?\Z')
+_RE_VUELO_LINE = re.compile(r'^\s*[AC\-]?\s*\d+\s*[A-Z]{3}\s+\d+')
+_RE_DAY_HEADER = re.compile(r'\bL\s+M\s+M\s+J\s+V\s+S\s+D\b')
+_RE_FIRST_INT = re.compile(r'\d+')
+
+# Líneas que nunca son vuelos (encabezados, pie de página, notas)
+_SKIP_PATTERNS = ('S VLO', 'EFECTIVIDAD', 'ITINERARIOS', 'Emisión',
+                  'EMISIÓN', 'UTC', 'Notas:', 'información')
+_RE_SKIP = re.compile('|'.join(re.escape(p) for p in _SKIP_PATTERNS))
+
+# Una línea de vuelo empieza con status (A/C/-) o con el número de vuelo
+_FLIGHT_FIRST_CHARS = frozenset('AC-0123456789')
+
+# Meses en español a formato corto; se indexa por las 3 primeras letras
+# para no depender de la palabra completa
+_MONTH_MAP = {
+    'enero': 'ENE', 'febrero': 'FEB', 'marzo': 'MAR', 'abril': 'ABR',
+    'mayo': 'MAY', 'junio': 'JUN', 'julio': 'JUL', 'agosto': 'AGO',
+    'septiembre': 'SEP', 'octubre': 'OCT', 'noviembre': 'NOV', 'diciembre': 'DIC'
+}
+_MONTH_PREFIX3 = {name[:3]: short for name, short in _MONTH_MAP.items()}
+
+# Caracteres que se examinan a partir de cada "Emisión" candidato al buscar el pie de página
+_FOOTER_WINDOW = 300
+
+# Códigos de equipo válidos: 0-8 (un dígito) o 10-14 (dos dígitos)
+_FREQ_CODES = frozenset({'0', '1', '2', '3', '4', '5', '6', '7', '8',
+                         '10', '11', '12', '13', '14'})
+# En las tablas de pdfplumber una celda de día vacía significa "no opera"
+_VALID_DAY_CODES = _FREQ_CODES | {''}
+
+# Tipos de token (ver ItineraryParser.classify)
+KIND_OTHER = 0
+KIND_AIRPORT = 1
+KIND_TIME = 2
+KIND_FREQ = 3      # Código de equipo (también es una hora válida)
+KIND_DATE = 4
+KIND_CONCAT = 5    # Número+aeropuerto concatenado (ej: "5MAD", "1030MAD")
+
+# Cache token -> tipo. Los tokens se repiten muchísimo (aeropuertos, horas,
+# códigos de equipo, fechas), así que casi todos se resuelven con un dict lookup.
+# Tiene tope de tamaño para que un documento con basura no crezca sin límite: al
+# llenarse se vacía, así los tokens de documentos viejos no lo congelan.
+_KIND_CACHE: Dict[str, int] = {}
+_KIND_CACHE_MAX = 50000
+
 
 def clean_spaced_numbers(text: str) -> str:
     """
@@ -27,7 +97,14 @@ def clean_spaced_numbers(text: str) -> str:
     Ej: "202 6" -> "2026", "2 6" -> "26"
     """
     # Remover espacios entre dígitos
-    return re.sub(r'(\d)\s+(\d)', r'\1\2', text)
+    return _RE_SPACED_DIGITS.sub(r'\1\2', text)
+
+
+def _format_footer_date(day: str, month: str, year: str) -> str:
+    """Convierte día, mes en español y año a formato corto: 26, enero, 2026 -> 26-ENE-2026"""
+    prefix = month[:3]
+    short = _MONTH_PREFIX3.get(prefix.lower(), prefix.upper())
+    return f"{day}-{short}-{year}"
 
 
 def extract_metadata(text: str) -> Dict:
@@ -44,37 +121,26 @@ def extract_metadata(text: str) -> Dict:
         'vigenciaFin': ''
     }
 
-    # Limpiar espacios en números del texto
-    clean_text = clean_spaced_numbers(text)
-
     # Buscar formato de pie de página:
     # "Emisión 02/26 Del 26 de enero 2026 al 22 de febrero 2026"
-    footer_match = re.search(
-        r'Emisi[oó]n\s+(\d{2}/\d{2})\s+Del\s+(\d{1,2})\s+de\s+([a-zA-Z]+)\s+(\d{4})\s+al\s+(\d{1,2})\s+de\s+([a-zA-Z]+)\s+(\d{4})',
-        clean_text, re.IGNORECASE
-    )
+    # Solo se limpian los espacios en números de una ventana corta después de cada
+    # "Emisión", en lugar de copiar y limpiar el documento completo.
+    footer_match = None
+    for candidate in _RE_FOOTER_START.finditer(text):
+        start = candidate.start()
+        window = clean_spaced_numbers(text[start:start + _FOOTER_WINDOW])
+        footer_match = _RE_FOOTER.match(window)
+        if footer_match:
+            break
 
     if footer_match:
         metadata['codigoEmision'] = footer_match.group(1)
 
-        # Convertir mes en español a formato corto
-        month_map = {
-            'enero': 'ENE', 'febrero': 'FEB', 'marzo': 'MAR', 'abril': 'ABR',
-            'mayo': 'MAY', 'junio': 'JUN', 'julio': 'JUL', 'agosto': 'AGO',
-            'septiembre': 'SEP', 'octubre': 'OCT', 'noviembre': 'NOV', 'diciembre': 'DIC'
-        }
-
         # Fecha inicio: "26 de enero 2026" -> "26-ENE-2026"
-        day_start = footer_match.group(2)
-        month_start = month_map.get(footer_match.group(3).lower(), footer_match.group(3)[:3].upper())
-        year_start = footer_match.group(4)
-        metadata['vigenciaInicio'] = f"{day_start}-{month_start}-{year_start}"
+        metadata['vigenciaInicio'] = _format_footer_date(*footer_match.group(2, 3, 4))
 
         # Fecha fin: "22 de febrero 2026" -> "22-FEB-2026"
-        day_end = footer_match.group(5)
-        month_end = month_map.get(footer_match.group(6).lower(), footer_match.group(6)[:3].upper())
-        year_end = footer_match.group(7)
-        metadata['vigenciaFin'] = f"{day_end}-{month_end}-{year_end}"
+        metadata['vigenciaFin'] = _format_footer_date(*footer_match.group(5, 6, 7))
 
         # Usar fecha de inicio como fecha de emisión
         metadata['fechaEmision'] = metadata['vigenciaInicio']
@@ -89,68 +155,108 @@ class ItineraryParser:
         'lun', 'mar', 'mie', 'jue', 'vie', 'sab', 'dom',
         'fechaInicio', 'fechaFin'
     ]
+    DAY_FIELDS = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab', 'dom']
+
+    # Plantilla de fila vacía: dict.copy() es mucho más barato que armar el dict por vuelo
+    _EMPTY_ROW = dict.fromkeys(COLUMN_NAMES, '')
 
-    def __init__(self):
-        # Posiciones de columna de los días (se calibran con el encabezado)
-        self.day_column_positions = None
+    # Los clasificadores usan métodos de str (sin regex): se llaman por cada token.
+    # isdecimal() equivale a \d (isdigit() aceptaría superíndices que int() rechaza)
 
     @staticmethod
     def is_airport(token: str) -> bool:
-        return bool(re.match(r'^[A-Z]{3}$', token))
+        return len(token) == 3 and token.isascii() and token.isalpha() and token.isupper()
 
     @staticmethod
     def is_time(token: str) -> bool:
         # Aceptar 1-4 dígitos (ej: "5" = 00:05, "10" = 00:10, "1030" = 10:30)
-        if not re.match(r'^\d{1,4}$', token):
-            return False
-        return int(token) <= 2359
+        return 1 <= len(token) <= 4 and token.isdecimal() and int(token) <= 2359
 
     @staticmethod
     def is_date(token: str) -> bool:
-        if not re.match(r'^\d{6}$', token):
-            return False
-        mm, dd = int(token[2:4]), int(token[4:6])
-        return 1 <= mm <= 12 and 1 <= dd <= 31
+        return (len(token) == 6 and token.isdecimal()
+                and 1 <= int(token[2:4]) <= 12 and 1 <= int(token[4:6]) <= 31)
 
     @staticmethod
     def is_frequency(token: str) -> bool:
         # Códigos de equipo: 0-8 (un dígito) o 10-14 (dos dígitos)
-        if re.match(r'^[0-8]$', token):
-            return True
-        if token in ['10', '11', '12', '13', '14']:
-            return True
-        return False
+        return token in _FREQ_CODES
 
-    def _find_section_boundary(self, tokens: List[str], start_idx: int) -> int:
+    @staticmethod
+    def split_concat(token: str) -> Optional[Tuple[str, str]]:
+        """
+        Separa un token concatenado número+aeropuerto (ej: "5MAD", "1030MAD").
+        Devuelve (número, aeropuerto) o None si el token no tiene esa forma.
+        """
+        if not 4 <= len(token) <= 7:
+            return None
+        number, airport = token[:-3], token[-3:]
+        if number.isdecimal() and airport.isascii() and airport.isalpha() and airport.isupper():
+            return number, airport
+        return None
+
+    @classmethod
+    def classify(cls, token: str) -> int:
+        """
+        Clasifica un token en uno de los tipos KIND_*.
+        Se calcula una sola vez por token y se reutiliza en todas las pasadas de parse_line.
+        """
+        if token in _FREQ_CODES:
+            return KIND_FREQ
+        if token.isdecimal():
+            if len(token) <= 4:
+                return KIND_TIME if int(token) <= 2359 else KIND_OTHER
+            return KIND_DATE if cls.is_date(token) else KIND_OTHER
+        if cls.is_airport(token):
+            return KIND_AIRPORT
+        if cls.split_concat(token):
+            return KIND_CONCAT
+        return KIND_OTHER
+
+    @classmethod
+    def classify_tokens(cls, tokens: List[str]) -> List[int]:
+        """Clasifica una lista de tokens usando _KIND_CACHE"""
+        cache_get = _KIND_CACHE.get
+        kinds = []
+        for token in tokens:
+            kind = cache_get(token)
+            if kind is None:
+                kind = cls.classify(token)
+                if len(_KIND_CACHE) >= _KIND_CACHE_MAX:
+                    _KIND_CACHE.clear()
+                _KIND_CACHE[token] = kind
+            kinds.append(kind)
+        return kinds
+
+    def _find_section_boundary(self, kinds: List[int], start_idx: int) -> int:
         """
         Encuentra el límite entre la sección de segmentos de vuelo y la sección de frecuencias/fechas.
         MEJORADO: Requiere al menos 2 aeropuertos antes de considerar frecuencias.
         """
         i = start_idx
+        n = len(kinds)
         airport_count = 0
 
-        while i < len(tokens):
-            token = tokens[i]
+        while i < n:
+            kind = kinds[i]
 
             # Contar aeropuertos encontrados
-            if self.is_airport(token):
-                airport_count += 1
-            # También contar si es un token concatenado número+aeropuerto (ej: "5MAD", "1030MAD")
-            elif re.match(r'^(\d{1,4})([A-Z]{3})$', token):
+            # (también los tokens concatenados número+aeropuerto, ej: "5MAD", "1030MAD")
+            if kind == KIND_AIRPORT or kind == KIND_CONCAT:
                 airport_count += 1
 
             # Solo buscar frecuencias si ya encontramos al menos 2 aeropuertos
             # (origen + destino mínimo)
-            if self.is_frequency(token) and airport_count >= 2:
+            if kind == KIND_FREQ and airport_count >= 2:
                 if i > start_idx:
                     lookahead = i
                     freq_count = 0
-                    while lookahead < len(tokens) and (
-                        self.is_frequency(tokens[lookahead]) or
-                        self.is_date(tokens[lookahead])
-                    ):
-                        if self.is_frequency(tokens[lookahead]):
+                    while lookahead < n:
+                        k = kinds[lookahead]
+                        if k == KIND_FREQ:
                             freq_count += 1
+                        elif k != KIND_DATE:
+                            break
                         lookahead += 1
                     if freq_count >= 2:
                         return i
@@ -158,19 +264,19 @@ class ItineraryParser:
                     return i
 
             # Si encontramos una fecha Y ya tenemos al menos 2 aeropuertos, parar
-            if self.is_date(token) and airport_count >= 2:
+            if kind == KIND_DATE and airport_count >= 2:
                 return i
 
             i += 1
 
-        return len(tokens)
+        return n
 
     def parse_line(self, line: str) -> Optional[Dict]:
         tokens = line.split()
         if len(tokens) < 4:
             return None
 
-        result = {col: '' for col in self.COLUMN_NAMES}
+        result = self._EMPTY_ROW.copy()
         idx = 0
 
         # 1. STATUS
@@ -184,16 +290,15 @@ class ItineraryParser:
 
         # 2. VUELO - handle both "1 MEX" and "1MEX" formats
         token = tokens[idx]
-        if re.match(r'^\d+$', token):
+        if token.isdecimal():
             # Format: "1" "MEX" (separate tokens)
             result['vuelo'] = token
             idx += 1
-        elif re.match(r'^(\d+)([A-Z]{3})$', token):
+        elif len(token) > 3 and token[:-3].isdecimal() and self.is_airport(token[-3:]):
             # Format: "1MEX" (concatenated - pdfplumber format)
-            match = re.match(r'^(\d+)([A-Z]{3})$', token)
-            result['vuelo'] = match.group(1)
+            result['vuelo'] = token[:-3]
             # Insert the airport back as a pseudo-token for segment parsing
-            tokens = tokens[:idx] + [match.group(1), match.group(2)] + tokens[idx+1:]
+            tokens[idx:idx+1] = [token[:-3], token[-3:]]
             idx += 1
         else:
             return None
@@ -201,50 +306,44 @@ class ItineraryParser:
         if idx >= len(tokens):
             return None
 
+        # Clasificar cada token una sola vez; las pasadas siguientes solo comparan enteros
+        kinds = self.classify_tokens(tokens)
+
         # 3-12. SEGMENTOS DE VUELO
-        boundary = self._find_section_boundary(tokens, idx)
-        flight_tokens = tokens[idx:boundary]
-
-        # Pre-process flight_tokens to split concatenated time+airport tokens
-        # e.g., "10MAD" -> "10", "MAD" or "1030MEX" -> "1030", "MEX"
-        expanded_tokens = []
-        for token in flight_tokens:
-            # Check if token is time+airport concatenated (e.g., "1030MAD", "955MEX", "5MAD")
-            concat_match = re.match(r'^(\d{1,4})([A-Z]{3})$', token)
-            if concat_match:
-                time_part = concat_match.group(1)
-                airport_part = concat_match.group(2)
-                if int(time_part) <= 2359:  # Valid time (1-4 digits)
-                    expanded_tokens.append(time_part)
-                    expanded_tokens.append(airport_part)
-                else:
-                    expanded_tokens.append(token)
-            else:
-                expanded_tokens.append(token)
+        boundary = self._find_section_boundary(kinds, idx)
 
-        flight_tokens = expanded_tokens
+        # Cada aeropuerto abre un segmento y acumula las horas que le siguen.
+        # Los tokens concatenados hora+aeropuerto (ej: "1030MAD", "955MEX", "5MAD")
+        # se tratan como la hora seguida del aeropuerto.
+        # Los códigos de aeropuerto se internan: se repiten en miles de filas y
+        # así todas comparten el mismo objeto str.
         segments = []
-        seg_idx = 0
-
-        while seg_idx < len(flight_tokens):
-            token = flight_tokens[seg_idx]
-            if self.is_airport(token):
-                segment = {'airport': token, 'times': []}
-                seg_idx += 1
-                while seg_idx < len(flight_tokens) and self.is_time(flight_tokens[seg_idx]):
-                    segment['times'].append(flight_tokens[seg_idx])
-                    seg_idx += 1
+        segment = None
+
+        for i in range(idx, boundary):
+            kind = kinds[i]
+            token = tokens[i]
+            if kind == KIND_CONCAT and int(token[:-3]) <= 2359:
+                if segment is not None:
+                    segment['times'].append(token[:-3])
+                segment = {'airport': sys.intern(token[-3:]), 'times': []}
+                segments.append(segment)
+            elif kind == KIND_AIRPORT:
+                segment = {'airport': sys.intern(token), 'times': []}
                 segments.append(segment)
+            elif kind == KIND_TIME or kind == KIND_FREQ:
+                if segment is not None:
+                    segment['times'].append(token)
             else:
-                seg_idx += 1
+                # Un token que no es hora corta la lista de horas del segmento actual
+                segment = None
 
         # DEBUG: Log problematic lines with only 1 segment
-        if len(segments) == 1 and result.get('vuelo'):
-            import sys
+        if DEBUG and len(segments) == 1 and result.get('vuelo'):
             print(f"[DEBUG] Vuelo {result['vuelo']} con solo 1 segmento:", file=sys.stderr)
             print(f"  Line: {line[:100]}...", file=sys.stderr)
             print(f"  Tokens: {tokens}", file=sys.stderr)
-            print(f"  Boundary: {boundary}, flight_tokens: {flight_tokens}", file=sys.stderr)
+            print(f"  Boundary: {boundary}, flight_tokens: {tokens[idx:boundary]}", file=sys.stderr)
             print(f"  Segments: {segments}", file=sys.stderr)
 
         if len(segments) >= 1:
@@ -275,54 +374,49 @@ class ItineraryParser:
         # Algunos vuelos tienen el destino mezclado con los días de frecuencia
         if len(segments) == 1 and result.get('origen'):
             # Buscar un aeropuerto en los tokens restantes (antes de las fechas)
-            remaining_tokens = tokens[boundary:]
-            for i, token in enumerate(remaining_tokens):
-                if self.is_airport(token):
+            for i in range(boundary, len(tokens)):
+                if kinds[i] == KIND_AIRPORT:
                     # Encontrado un aeropuerto - usarlo como destino
-                    result['escala1'] = token
+                    result['escala1'] = sys.intern(tokens[i])
                     # Buscar tiempo de llegada antes de este aeropuerto
-                    if i > 0 and self.is_time(remaining_tokens[i-1]):
-                        result['llegada1'] = remaining_tokens[i-1]
+                    if i > boundary and kinds[i-1] in (KIND_TIME, KIND_FREQ):
+                        result['llegada1'] = tokens[i-1]
                     break
 
         # 13-21. FRECUENCIAS Y FECHAS
         # NUEVO: Parsear desde el final de la línea (más confiable)
-        day_fields = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab', 'dom']
+        day_fields = self.DAY_FIELDS
 
-        # Recolectar todos los tokens restantes
-        remaining_tokens = tokens[boundary:]
-
-        # Buscar fechas desde el final (son números de 6 dígitos)
+        # Buscar las fechas (números de 6 dígitos) después del boundary.
+        # Solo se usan las dos primeras, así que el recorrido se detiene ahí.
         dates = []
-        date_indices = []
-        for i, token in enumerate(remaining_tokens):
-            if self.is_date(token):
-                dates.append(token)
-                date_indices.append(i)
+        first_date_idx = -1
+        for i in range(boundary, len(tokens)):
+            if kinds[i] == KIND_DATE:
+                if first_date_idx < 0:
+                    first_date_idx = i
+                dates.append(tokens[i])
+                if len(dates) == 2:
+                    break
 
         # Encontrar dónde terminan los códigos de día
         # Los códigos están ANTES de las fechas
-        if date_indices:
-            first_date_idx = date_indices[0]
+        if first_date_idx >= 0:
             # Los 7 tokens antes de la primera fecha son los días (si existen)
-            day_tokens_start = max(0, first_date_idx - 7)
-            day_tokens = remaining_tokens[day_tokens_start:first_date_idx]
+            day_end = first_date_idx
         else:
             # No hay fechas, tomar los últimos tokens como días
-            day_tokens = remaining_tokens[-7:] if len(remaining_tokens) >= 7 else remaining_tokens
+            day_end = len(tokens)
+        day_start = max(boundary, day_end - 7)
 
         # Asignar códigos de equipo a días
         # Si tenemos exactamente 7, asignar en orden
         # Si tenemos menos, alinear a la DERECHA (hacia domingo)
-        valid_day_codes = []
-        for token in day_tokens:
-            if self.is_frequency(token):
-                valid_day_codes.append(token)
+        valid_day_codes = [sys.intern(tokens[i]) for i in range(day_start, day_end) if kinds[i] == KIND_FREQ]
 
         # DEBUG: Añadir info de diagnóstico
-        import sys
-        if result.get('vuelo'):
-            print(f"[DEBUG] Vuelo {result['vuelo']}: day_tokens={day_tokens}, valid_codes={valid_day_codes}", file=sys.stderr)
+        if DEBUG and result.get('vuelo'):
+            print(f"[DEBUG] Vuelo {result['vuelo']}: day_tokens={tokens[day_start:day_end]}, valid_codes={valid_day_codes}", file=sys.stderr)
 
         if len(valid_day_codes) == 7:
             # 7 códigos = todos los días en orden
@@ -345,76 +439,83 @@ class ItineraryParser:
 
     def parse_text(self, text: str) -> List[Dict]:
         flights = []
-        skip_patterns = ['S VLO', 'EFECTIVIDAD', 'ITINERARIOS', 'Emisión',
-                        'EMISIÓN', 'UTC', 'Notas:', 'información']
 
         lines = text.split('\n')
 
-        # Primero, buscar el encabezado para calibrar posiciones de columna
-        self._calibrate_day_columns(lines)
+        # El encabezado para calibrar posiciones de columna se busca en la misma
+        # pasada: el parseo de líneas no depende de la calibración. Es una variable
+        # local (no un atributo) para que la instancia compartida no tenga estado
+        day_column_positions = None
+
+        # Métodos de los patrones como locales: se llaman una vez por línea
+        is_vuelo_line = _RE_VUELO_LINE.match
+        has_skip_pattern = _RE_SKIP.search
 
         for line in lines:
+            if day_column_positions is None:
+                day_column_positions = self._day_header_positions(line)
+
             original_line = line  # Guardar línea original con espacios
             line = line.strip()
-            if not line or re.match(r'^[\s\-]+$', line):
-                continue
-            if any(p in line for p in skip_patterns):
+            if not line:
                 continue
-            if re.match(r'^\s*\d{1,3}\s*$', line):
+            # Descartar sin regex las líneas que no pueden ser vuelos (la mayoría)
+            if line[0] not in _FLIGHT_FIRST_CHARS and not line[0].isdecimal():
                 continue
             # Match both formats:
             # - "1 MEX 10" (PDFKit format with spaces)
             # - "1MEX 10MAD" (pdfplumber format, concatenated)
-            if re.match(r'^\s*[AC\-]?\s*\d+\s*[A-Z]{3}\s+\d+', line):
+            # El regex anclado falla rápido; los patrones de skip (búsqueda en toda
+            # la línea) solo se revisan en las líneas que parecen vuelos.
+            # Las líneas de solo guiones o solo número de página no pueden hacer
+            # match (piden dígitos seguidos de un aeropuerto), así que no hace
+            # falta descartarlas aparte.
+            if is_vuelo_line(line) and not has_skip_pattern(line):
                 parsed = self.parse_line(original_line)
                 if parsed and parsed['vuelo']:
                     flights.append(parsed)
 
         return flights
 
-    def _calibrate_day_columns(self, lines: List[str]):
-        """
-        Busca el encabezado 'L M M J V S D' y extrae las posiciones de cada columna.
-        Esto permite mapear correctamente las frecuencias a los días.
-        """
-        day_letters = ['L', 'M', 'M', 'J', 'V', 'S', 'D']
+    @staticmethod
+    def _day_header_positions(line: str) -> Optional[List[int]]:
+        """Posiciones de las columnas L M M J V S D si la línea es el encabezado, o None"""
+        # Buscar línea que contenga el patrón de días
+        # Puede ser "L M M J V S D" o similar
+        # (filtro barato: sin 'L' y 'D' la línea no puede ser el encabezado)
+        if not ('L' in line and 'D' in line and _RE_DAY_HEADER.search(line)):
+            return None
 
-        for line in lines:
-            # Buscar línea que contenga el patrón de días
-            # Puede ser "L M M J V S D" o similar
-            if re.search(r'\bL\s+M\s+M\s+J\s+V\s+S\s+D\b', line):
-                positions = []
-                # Encontrar posición de cada letra de día
-                idx = 0
-                for day in day_letters:
-                    pos = line.find(day, idx)
-                    if pos != -1:
-                        positions.append(pos)
-                        idx = pos + 1
-                    else:
-                        positions.append(-1)
-
-                if len(positions) == 7 and all(p >= 0 for p in positions):
-                    self.day_column_positions = positions
-                    return
+        positions = []
+        # Encontrar posición de cada letra de día
+        idx = 0
+        for day in ['L', 'M', 'M', 'J', 'V', 'S', 'D']:
+            pos = line.find(day, idx)
+            if pos != -1:
+                positions.append(pos)
+                idx = pos + 1
+            else:
+                positions.append(-1)
 
-        # Si no encontramos el encabezado, usar posiciones por defecto
-        self.day_column_positions = None
+        if len(positions) == 7 and all(p >= 0 for p in positions):
+            return positions
+        return None
 
-    def _assign_frequencies_by_position(self, line: str, day_fields: List[str], expected_frequencies: List[str]) -> Dict[str, str]:
+    def _assign_frequencies_by_position(self, line: str, day_column_positions: Optional[List[int]],
+                                        day_fields: List[str], expected_frequencies: List[str]) -> Dict[str, str]:
         """
         Asigna códigos de equipo a días revisando directamente cada columna.
         Solo devuelve resultados si la cantidad encontrada coincide con expected_frequencies.
         """
         result = {}
 
-        if not self.day_column_positions:
+        if not day_column_positions:
             return result
 
         found_codes = []
 
         # Para cada día, buscar código de equipo en su columna
-        for day_idx, day_pos in enumerate(self.day_column_positions):
+        for day_idx, day_pos in enumerate(day_column_positions):
             # Buscar SOLO en la posición exacta (±1 máximo)
             for offset in [0, -1, 1]:
                 pos = day_pos + offset
@@ -431,7 +532,7 @@ class ItineraryParser:
                     # Verificar si es un número de dos dígitos (10-14)
                     if char == '1' and next_char.isdigit() and not prev_char.isdigit():
                         two_digit = char + next_char
-                        if two_digit in ['10', '11', '12', '13', '14']:
+                        if two_digit in _FREQ_CODES:
                             found_codes.append((day_fields[day_idx], two_digit))
                             break
                     # Si es un dígito aislado (no parte de un número mayor)
@@ -455,6 +556,30 @@ class ItineraryParser:
         return result
 
 
+# Misma validación que en el texto; horas y fechas en tablas son más laxas (abajo)
+_is_airport_cell = ItineraryParser.is_airport
+
+
+def _is_time_cell(cell: str) -> bool:
+    # En tablas no se valida el rango de la hora: basta con 1-4 dígitos
+    return 1 <= len(cell) <= 4 and cell.isdecimal()
+
+
+def _is_date_cell(cell: str) -> bool:
+    return len(cell) == 6 and cell.isdecimal()
+
+
+# Secuencia de columnas de segmentos después del origen y qué forma debe tener cada celda
+_TABLE_SEGMENT_FIELDS = (
+    ('salida1', _is_time_cell),
+    ('escala1', _is_airport_cell),   # Escala 1 / Destino
+    ('llegada1', _is_time_cell),
+    ('salida2', _is_time_cell),      # Más segmentos si existen...
+    ('escala2', _is_airport_cell),
+    ('llegada2', _is_time_cell),
+)
+
+
 def parse_table_row(row: List[str], day_fields: List[str]) -> Optional[Dict]:
     """
     Parsea una fila de tabla extraída por pdfplumber.
@@ -470,26 +595,18 @@ def parse_table_row(row: List[str], day_fields: List[str]) -> Optional[Dict]:
     # [STATUS, VLO, ORIGEN, SALIDA, ESCALA/DESTINO, LLEGADA, ..., L, M, M, J, V, S, D, INICIO, FIN]
     # El número exacto de columnas puede variar según escalas
 
-    result = {
-        'status': '', 'vuelo': '', 'origen': '', 'salida1': '',
-        'escala1': '', 'llegada1': '', 'salida2': '', 'escala2': '',
-        'llegada2': '', 'salida3': '', 'destino': '', 'llegada3': '',
-        'lun': '', 'mar': '', 'mie': '', 'jue': '', 'vie': '', 'sab': '', 'dom': '',
-        'fechaInicio': '', 'fechaFin': ''
-    }
+    result = ItineraryParser._EMPTY_ROW.copy()
 
     # Buscar índice donde empiezan los días (buscar patrón de 7 celdas con dígitos 0-14)
+    # Ventana deslizante: se mantiene el conteo de celdas válidas de las 7 siguientes
     day_start_idx = -1
+    is_valid = [cell in _VALID_DAY_CODES for cell in row]
+    valid_codes = sum(is_valid[:7])
     for i in range(len(row) - 8):  # Necesitamos al menos 7 celdas para días + fechas
-        # Verificar si las siguientes 7 celdas parecen códigos de equipo
-        potential_days = row[i:i+7]
-        valid_codes = 0
-        for cell in potential_days:
-            if cell in ['0', '1', '2', '3', '4', '5', '6', '7', '8', '10', '11', '12', '13', '14', '']:
-                valid_codes += 1
         if valid_codes >= 5:  # Al menos 5 de 7 parecen códigos válidos
             day_start_idx = i
             break
+        valid_codes += is_valid[i + 7] - is_valid[i]
 
     if day_start_idx == -1:
         return None  # No encontramos la sección de días
@@ -507,16 +624,19 @@ def parse_table_row(row: List[str], day_fields: List[str]) -> Optional[Dict]:
     if len(flight_data) > idx and flight_data[idx]:
         # Puede ser solo número o número+origen concatenado
         vuelo_cell = flight_data[idx]
-        match = re.match(r'^(\d+)([A-Z]{3})?$', vuelo_cell)
+        match = _RE_VUELO_CELL.match(vuelo_cell)
         if match:
             result['vuelo'] = match.group(1)
             if match.group(2):
-                result['origen'] = match.group(2)
+                result['origen'] = sys.intern(match.group(2))
                 idx += 1
             else:
                 idx += 1
                 if len(flight_data) > idx:
-                    result['origen'] = flight_data[idx]
+                    # Solo se internan valores validados: la celda viene del PDF sin
+                    # revisar y en 3.12 los str internados nunca se liberan
+                    origen = flight_data[idx]
+                    result['origen'] = sys.intern(origen) if _is_airport_cell(origen) else origen
                     idx += 1
         else:
             return None  # No es un vuelo válido
@@ -527,37 +647,17 @@ def parse_table_row(row: List[str], day_fields: List[str]) -> Optional[Dict]:
 
     # Origen (si no lo tenemos)
     if not result['origen'] and seg_idx < len(segments):
-        if re.match(r'^[A-Z]{3}$', segments[seg_idx]):
-            result['origen'] = segments[seg_idx]
+        if _is_airport_cell(segments[seg_idx]):
+            result['origen'] = sys.intern(segments[seg_idx])
             seg_idx += 1
 
-    # Salida 1
-    if seg_idx < len(segments) and re.match(r'^\d{1,4}$', segments[seg_idx]):
-        result['salida1'] = segments[seg_idx]
-        seg_idx += 1
-
-    # Escala 1 / Destino
-    if seg_idx < len(segments) and re.match(r'^[A-Z]{3}$', segments[seg_idx]):
-        result['escala1'] = segments[seg_idx]
-        seg_idx += 1
-
-    # Llegada 1
-    if seg_idx < len(segments) and re.match(r'^\d{1,4}$', segments[seg_idx]):
-        result['llegada1'] = segments[seg_idx]
-        seg_idx += 1
-
-    # Más segmentos si existen...
-    if seg_idx < len(segments) and re.match(r'^\d{1,4}$', segments[seg_idx]):
-        result['salida2'] = segments[seg_idx]
-        seg_idx += 1
-
-    if seg_idx < len(segments) and re.match(r'^[A-Z]{3}$', segments[seg_idx]):
-        result['escala2'] = segments[seg_idx]
-        seg_idx += 1
-
-    if seg_idx < len(segments) and re.match(r'^\d{1,4}$', segments[seg_idx]):
-        result['llegada2'] = segments[seg_idx]
-        seg_idx += 1
+    # Salida 1, escala 1, llegada 1, salida 2, escala 2, llegada 2 (en ese orden);
+    # una celda que no tiene la forma esperada se salta ese campo sin consumirse.
+    # Aeropuertos, horas y códigos de día válidos se internan (se repiten en miles de filas)
+    for field, matches in _TABLE_SEGMENT_FIELDS:
+        if seg_idx < len(segments) and matches(segments[seg_idx]):
+            result[field] = sys.intern(segments[seg_idx])
+            seg_idx += 1
 
     # Extraer días (7 columnas a partir de day_start_idx)
     for i, day_field in enumerate(day_fields):
@@ -566,17 +666,17 @@ def parse_table_row(row: List[str], day_fields: List[str]) -> Optional[Dict]:
             # Guardar si es un código válido (0-14)
             # Vacío = no opera ese día
             if code and code.strip() and code not in ['-1', '-', 'None']:
-                result[day_field] = code
+                result[day_field] = sys.intern(code) if code in _FREQ_CODES else code
 
     # Extraer fechas (después de los días)
     date_start_idx = day_start_idx + 7
     if date_start_idx < len(row) and row[date_start_idx]:
         fecha = row[date_start_idx]
-        if re.match(r'^\d{6}$', fecha):
+        if _is_date_cell(fecha):
             result['fechaInicio'] = fecha
     if date_start_idx + 1 < len(row) and row[date_start_idx + 1]:
         fecha = row[date_start_idx + 1]
-        if re.match(r'^\d{6}$', fecha):
+        if _is_date_cell(fecha):
             result['fechaFin'] = fecha
 
     # Validar que tengamos datos mínimos
@@ -585,23 +685,41 @@ def parse_table_row(row: List[str], day_fields: List[str]) -> Optional[Dict]:
     return None
 
 
-def extract_flights_from_pdf_tables(pdf_data: bytes) -> List[Dict]:
+def extract_flights_from_pdf_tables(pdf_data: bytes) -> Tuple[List[Dict], str]:
     """
     Extrae vuelos usando extracción de tablas de pdfplumber.
     Esto preserva la estructura de columnas correctamente.
+
+    Devuelve (vuelos, texto). El texto de las páginas se extrae dentro del mismo
+    pdfplumber.open() para no volver a abrir el PDF al calcular los metadatos.
+
+    extract_tables() es costoso, así que si la primera página no tiene tablas
+    se asume que el PDF no es tabular y no se procesan las demás páginas.
+
+    Las páginas se procesan en serie: pdfplumber (pdfminer) no es thread-safe
+    sobre un mismo documento, así que un ThreadPool no es seguro aquí.
     """
     if not HAS_PDFPLUMBER:
-        return []
+        return [], ''
 
     flights = []
-    day_fields = ['lun', 'mar', 'mie', 'jue', 'vie', 'sab', 'dom']
+    all_text = []
+    day_fields = ItineraryParser.DAY_FIELDS
 
     try:
         with pdfplumber.open(io.BytesIO(pdf_data)) as pdf:
-            for page in pdf.pages:
+            for page_number, page in enumerate(pdf.pages):
                 # Extraer tablas de la página
                 tables = page.extract_tables()
 
+                if page_number == 0 and not tables:
+                    # Sin tablas en la primera página: usar extracción de texto
+                    return [], ''
+
+                text = page.extract_text()
+                if text:
+                    all_text.append(text)
+
                 for table in tables:
                     if not table:
                         continue
@@ -615,12 +733,20 @@ def extract_flights_from_pdf_tables(pdf_data: bytes) -> List[Dict]:
                         if parsed:
                             flights.append(parsed)
 
+                # Liberar los objetos de layout cacheados de la página ya procesada
+                page.flush_cache()
+
     except Exception as e:
-        import sys
         print(f"[ERROR] Table extraction failed: {e}", file=sys.stderr)
-        return []
+        return [], ''
+
+    return flights, '\n'.join(all_text)
+
 
-    return flights
+def _zip_member_sort_key(name: str) -> int:
+    """Ordena los archivos del ZIP por el primer número de su nombre (p2.txt antes que p10.txt)"""
+    match = _RE_FIRST_INT.search(name)
+    return int(match.group()) if match else 0
 
 
 def extract_text_from_zip(zip_data: bytes) -> str:
@@ -629,7 +755,7 @@ def extract_text_from_zip(zip_data: bytes) -> str:
     with zipfile.ZipFile(io.BytesIO(zip_data)) as zf:
         txt_files = sorted(
             [f for f in zf.namelist() if f.endswith('.txt')],
-            key=lambda x: int(re.search(r'\d+', x).group()) if re.search(r'\d+', x) else 0
+            key=_zip_member_sort_key
         )
         for txt_file in txt_files:
             content = zf.read(txt_file).decode('utf-8', errors='ignore')
@@ -648,6 +774,7 @@ def extract_text_from_pdf(pdf_data: bytes) -> str:
                     text = page.extract_text()
                     if text:
                         all_text.append(text)
+                    page.flush_cache()
             return '\n'.join(all_text)
         except Exception:
             pass  # Fall through to PyPDF2
@@ -670,17 +797,26 @@ def extract_text_from_pdf(pdf_data: bytes) -> str:
 
 def is_pdf(data: bytes) -> bool:
     """Check if data is a PDF file"""
-    return data[:4] == b'%PDF'
+    return data.startswith(b'%PDF')
 
 
 def is_zip(data: bytes) -> bool:
     """Check if data is a ZIP file"""
-    return data[:4] == b'PK\x03\x04'
+    return data.startswith(b'PK\x03\x04')
+
+
+def detect_container(data: bytes) -> Optional[str]:
+    """Return 'pdf', 'zip' or None from the magic bytes (startswith, no slice copies)"""
+    if is_pdf(data):
+        return 'pdf'
+    if is_zip(data):
+        return 'zip'
+    return None
 
 
 def is_gzip(data: bytes) -> bool:
     """Check if data is gzip compressed"""
-    return data[:2] == b'\x1f\x8b'
+    return data.startswith(b'\x1f\x8b')
 
 
 def is_zlib(data: bytes) -> bool:
@@ -712,42 +848,177 @@ def decompress_gzip(data: bytes) -> bytes:
 
 def decompress_zlib(data: bytes) -> bytes:
     """Decompress zlib data"""
-    import zlib
     return zlib.decompress(data)
 
 
 def decompress_raw_deflate(data: bytes) -> bytes:
     """Decompress raw deflate data (iOS Compression framework format)"""
-    import zlib
     # wbits=-15 tells zlib to expect raw deflate without header
     return zlib.decompress(data, wbits=-15)
 
 
+def dumps_json(obj) -> bytes:
+    """Serialize to UTF-8 JSON bytes (orjson if available)"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+_ROW_VALUES = itemgetter(*ItineraryParser.COLUMN_NAMES)
+
+
+def build_response(flights: List[Dict], source_type: str, text: str, columnar: bool = False) -> Dict:
+    """
+    Arma la respuesta de parseo. Con columnar=True (?format=columns) los vuelos se
+    envían como filas en el orden de COLUMN_NAMES en lugar de un dict por vuelo:
+    las claves se escriben una sola vez y el JSON es mucho más chico.
+    """
+    response = {'success': True, 'total': len(flights)}
+    if columnar:
+        response['columns'] = ItineraryParser.COLUMN_NAMES
+        response['rows'] = [_ROW_VALUES(flight) for flight in flights]
+    else:
+        response['flights'] = flights
+    response['source'] = source_type
+    response['textLength'] = len(text)
+    response['metadata'] = extract_metadata(text)
+    return response
+
+
+# Respuestas ya serializadas de los últimos documentos: los clientes suelen reenviar
+# el mismo archivo (reintentos, doble envío) y así se evita extraer y parsear de nuevo.
+# La clave es un hash del body crudo más lo que cambia la respuesta (ruta con query,
+# Content-Type y Content-Encoding).
+_RESPONSE_CACHE: 'OrderedDict[bytes, Tuple[str, bytes]]' = OrderedDict()
+_RESPONSE_CACHE_MAX = 8
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+
+def response_cache_key(body: bytes, *parts: str) -> bytes:
+    """Digest of the raw request body plus the request attributes that shape the response"""
+    h = hashlib.blake2b(body, digest_size=16)
+    for part in parts:
+        h.update(b'\0' + part.encode('utf-8', errors='surrogateescape'))
+    return h.digest()
+
+
+# El parser no guarda estado (la calibración de columnas es local a parse_text),
+# así que una sola instancia se comparte entre todas las requests, incluso concurrentes
+_PARSER = ItineraryParser()
+
+
 class handler(BaseHTTPRequestHandler):
+    # wfile con buffer: los headers (que end_headers ya junta en un solo write) y un
+    # body chico salen en un único send; BufferedWriter escribe directo los bodies
+    # grandes y handle_one_request()/finish() hacen el flush al terminar.
+    wbufsize = -1
+
+    # HTTP/1.1: la conexión queda abierta entre requests (keep-alive), por eso toda
+    # respuesta lleva Content-Length
+    protocol_version = 'HTTP/1.1'
+
+    def handle_expect_100(self):
+        """
+        Con el wfile con buffer, el '100 Continue' quedaría esperando en el buffer
+        mientras el cliente espera la respuesta para mandar el body: se envía ya.
+        """
+        ok = super().handle_expect_100()
+        self.wfile.flush()
+        return ok
+
+    def _send_body(self, status: int, content_type: str, payload: bytes):
+        """Envía la respuesta completa con Content-Length en una sola escritura del body"""
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, status: int, response: Dict):
+        self._send_body(status, 'application/json', dumps_json(response))
+
+    def _send_cacheable(self, cache_key: bytes, content_type: str, payload: bytes):
+        """Envía una respuesta 200 y la guarda en el cache LRU de respuestas"""
+        with _RESPONSE_CACHE_LOCK:
+            _RESPONSE_CACHE[cache_key] = (content_type, payload)
+            if len(_RESPONSE_CACHE) > _RESPONSE_CACHE_MAX:
+                _RESPONSE_CACHE.popitem(last=False)
+        self._send_body(200, content_type, payload)
+
+    def _read_body(self) -> bytearray:
+        """
+        Lee el body directo a un bytearray del tamaño de Content-Length con readinto(),
+        sin buffers intermedios. Las funciones de detección/descompresión y los
+        extractores aceptan bytearray igual que bytes.
+        """
+        if 'Content-Length' not in self.headers or 'Transfer-Encoding' in self.headers:
+            # Sin Content-Length (ej: chunked) el body no se lee: lo que quede en el
+            # socket no puede tomarse como la siguiente request del keep-alive
+            self.close_connection = True
+        content_length = max(0, int(self.headers.get('Content-Length', 0)))
+        body = bytearray(content_length)
+        received = 0
+        with memoryview(body) as view:
+            while received < content_length:
+                n = self.rfile.readinto(view[received:])
+                if not n:
+                    break
+                received += n
+        del body[received:]  # Body más corto que Content-Length
+        return body
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def do_POST(self):
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length)
+            body = self._read_body()
             content_type = self.headers.get('Content-Type', '')
 
+            # Mismo archivo y mismas opciones que una request reciente: respuesta cacheada
+            cache_key = response_cache_key(
+                body, self.path, content_type, self.headers.get('Content-Encoding', '')
+            )
+            with _RESPONSE_CACHE_LOCK:
+                cached = _RESPONSE_CACHE.get(cache_key)
+                if cached is not None:
+                    _RESPONSE_CACHE.move_to_end(cache_key)
+            if cached is not None:
+                self._send_body(200, *cached)
+                return
+
             text = ''
             source_type = 'unknown'
 
-            # Check if data is compressed and decompress
-            if is_gzip(body):
+            # Check if data is compressed and decompress.
+            # Content-Encoding (standard HTTP) decides when present; otherwise sniff the bytes.
+            content_encoding = self.headers.get('Content-Encoding', '').lower()
+            if 'gzip' in content_encoding:
+                body = decompress_gzip(body)
+                source_type = 'gzip+'
+            elif 'deflate' in content_encoding:
+                # HTTP deflate is zlib-wrapped, but some clients send raw deflate
+                if is_zlib(body):
+                    body = decompress_zlib(body)
+                    source_type = 'zlib+'
+                else:
+                    body = decompress_raw_deflate(body)
+                    source_type = 'deflate+'
+            elif is_gzip(body):
                 body = decompress_gzip(body)
                 source_type = 'gzip+'
             elif is_zlib(body):
                 body = decompress_zlib(body)
                 source_type = 'zlib+'
-            elif 'application/zlib' in content_type or 'application/deflate' in content_type:
+            elif is_raw_deflate(content_type):
                 # iOS Compression framework sends raw deflate with this Content-Type
                 body = decompress_raw_deflate(body)
                 source_type = 'deflate+'
@@ -755,20 +1026,19 @@ class handler(BaseHTTPRequestHandler):
             # mode=rawtext: devolver solo el texto extraído, sin parsear flights
             query = parse_qs(urlparse(self.path).query)
             mode = query.get('mode', [None])[0]
+            columnar = query.get('format', [None])[0] == 'columns'
+
+            container = detect_container(body)
 
             if mode == 'rawtext':
-                if is_pdf(body):
+                if container == 'pdf':
                     text = extract_text_from_pdf(body)
-                elif is_zip(body):
+                elif container == 'zip':
                     text = extract_text_from_zip(body)
                 else:
                     text = body.decode('utf-8', errors='ignore')
 
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/plain; charset=utf-8')
-                self.send_header('Access-Control-Allow-Origin', '*')
-                self.end_headers()
-                self.wfile.write(text.encode('utf-8'))
+                self._send_cacheable(cache_key, 'text/plain; charset=utf-8', text.encode('utf-8'))
                 return
 
             # Determine input type and extract text
@@ -776,39 +1046,26 @@ class handler(BaseHTTPRequestHandler):
 
             if 'application/json' in content_type and not compressed_prefix:
                 # JSON with text field
-                data = json.loads(body.decode('utf-8'))
+                data = json.loads(body)  # json acepta bytes directamente (sin str intermedio)
                 text = data.get('text', '')
                 source_type = 'json'
-            elif is_pdf(body):
+            elif container == 'pdf':
                 # PDF file - intentar extracción de tablas primero
-                table_flights = extract_flights_from_pdf_tables(body)
+                table_flights, table_text = extract_flights_from_pdf_tables(body)
                 if table_flights and len(table_flights) > 0:
                     # Éxito con tablas - usar estos vuelos directamente
-                    text = extract_text_from_pdf(body)  # Para metadatos
+                    text = table_text  # Para metadatos
                     source_type = compressed_prefix + 'pdf-table'
 
-                    metadata = extract_metadata(text)
-
-                    response = {
-                        'success': True,
-                        'total': len(table_flights),
-                        'flights': table_flights,
-                        'source': source_type,
-                        'textLength': len(text),
-                        'metadata': metadata
-                    }
-
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'application/json')
-                    self.send_header('Access-Control-Allow-Origin', '*')
-                    self.end_headers()
-                    self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+                    response = build_response(table_flights, source_type, text, columnar)
+                    self._send_cacheable(cache_key, 'application/json', dumps_json(response))
                     return
 
-                # Fallback a extracción de texto
-                text = extract_text_from_pdf(body)
+                # Fallback a extracción de texto.
+                # Si se recorrieron todas las páginas, table_text ya es ese mismo texto.
+                text = table_text or extract_text_from_pdf(body)
                 source_type = compressed_prefix + 'pdf'
-            elif is_zip(body):
+            elif container == 'zip':
                 # ZIP file with TXT files
                 text = extract_text_from_zip(body)
                 source_type = compressed_prefix + 'zip'
@@ -817,35 +1074,17 @@ class handler(BaseHTTPRequestHandler):
                 text = body.decode('utf-8', errors='ignore')
                 source_type = compressed_prefix + 'text' if compressed_prefix else 'text'
 
-            # Extract metadata from header
-            metadata = extract_metadata(text)
-
-            # Parse the text
-            parser = ItineraryParser()
-            flights = parser.parse_text(text)
-
-            response = {
-                'success': True,
-                'total': len(flights),
-                'flights': flights,
-                'source': source_type,
-                'textLength': len(text),
-                'metadata': metadata
-            }
+            # Parse the text (metadata comes from the footer in build_response)
+            flights = _PARSER.parse_text(text)
 
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+            response = build_response(flights, source_type, text, columnar)
+            self._send_cacheable(cache_key, 'application/json', dumps_json(response))
 
         except Exception as e:
             response = {'success': False, 'error': str(e), 'total': 0, 'flights': []}
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            # El body puede no haberse leído completo: no reutilizar la conexión
+            self.close_connection = True
+            self._send_json(500, response)
 
     def do_GET(self):
         response = {
@@ -859,8 +1098,4 @@ class handler(BaseHTTPRequestHandler):
                 'json': True
             }
         }
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode('utf-8'))
+        self._send_json(200, response)